@@ -1,9 +1,23 @@
 # bot.py — Keyword-only NASDAQ news (no AI)
-import os, re, time, json, hashlib, requests, feedparser
+import io, os, re, time, json, queue, string, hashlib, heapq, requests, threading
+from types import SimpleNamespace
+from xml.etree import ElementTree as ET
 from datetime import datetime, timezone, timedelta
-from urllib.parse import urlparse
-from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from email.utils import parsedate_to_datetime
+from urllib3.util.retry import Retry
+
+_feedparser_mod = None
+def _feedparser():
+    # lazy import: keeps startup (and the "bot started" message) fast
+    global _feedparser_mod
+    if _feedparser_mod is None:
+        try:
+            import fastfeedparser as _feedparser_mod   # lxml-backed, same entries/title/link API
+        except Exception:
+            import feedparser as _feedparser_mod
+    return _feedparser_mod
 
 try:
     from zoneinfo import ZoneInfo
@@ -17,6 +31,7 @@ TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 SLEEP_SECONDS       = 300    # 5 minutes
 MAX_POSTS_PER_CYCLE = 5
 MAX_AGE_MINUTES     = 15     # 15 minutes freshness
+FEED_MAX_BYTES      = 2*1024*1024   # cap per feed download
 
 DEFAULT_FEEDS = [
     "https://www.reuters.com/markets/us/rss",
@@ -32,66 +47,215 @@ DEFAULT_FEEDS = [
     "https://www.theguardian.com/us/business/rss",
 ]
 FEEDS = [u.strip() for u in os.getenv("FEEDS", ",".join(DEFAULT_FEEDS)).split(",") if u.strip()]
+FEED_WORKERS = int(os.getenv("FEED_WORKERS", "8"))
+
+SEEN_PATH, SEEN_LOG, SEEN_LIMIT = "seen.json", "seen.log", 5000
+
+# Bloom filter: long-term memory for uids evicted from the exact set.
+# 1 MiB of bits / 7 probes ≈ <1% false positives at ~100k entries; a false
+# positive only means one real headline is skipped once, which is acceptable.
+BLOOM_PATH, BLOOM_BITS, BLOOM_K = "seen.bloom", 1<<23, 7
+_bloom = bytearray(BLOOM_BITS//8)
+def _bloom_probes(uid:str):
+    h=hashlib.sha1(uid.encode("utf-8")).digest()
+    h1=int.from_bytes(h[:8],"big"); h2=int.from_bytes(h[8:16],"big")|1
+    return ((h1+i*h2)%BLOOM_BITS for i in range(BLOOM_K))
+def bloom_add(uid:str):
+    for b in _bloom_probes(uid): _bloom[b>>3]|=1<<(b&7)
+def bloom_has(uid:str)->bool:
+    return all(_bloom[b>>3]>>(b&7)&1 for b in _bloom_probes(uid))
+def load_bloom():
+    global _bloom
+    if os.path.exists(BLOOM_PATH):
+        try:
+            data=open(BLOOM_PATH,"rb").read()
+            if len(data)==BLOOM_BITS//8: _bloom=bytearray(data)
+        except: pass
+def save_bloom():
+    try: open(BLOOM_PATH,"wb").write(bytes(_bloom))
+    except Exception as e: print("bloom:",e)
 
-SEEN_PATH, SEEN_LIMIT = "seen.json", 5000
+# seen is a dict used as an insertion-ordered set, so the SEEN_LIMIT trim
+# evicts the oldest uids (a plain set's iteration order made eviction random).
+# Persistence is an append-only uid-per-line log; compaction rewrites it
+# atomically once it holds twice the limit.
+_seen_log_lines=0
 def load_seen():
-    if os.path.exists(SEEN_PATH):
+    global _seen_log_lines
+    s={}
+    if os.path.exists(SEEN_PATH):   # legacy full-dump format, removed on first compaction
         try:
             data = json.load(open(SEEN_PATH, "r", encoding="utf-8"))
-            return set(data if isinstance(data, list) else [])
+            s.update(dict.fromkeys(data if isinstance(data, list) else []))
+        except: pass
+    if os.path.exists(SEEN_LOG):
+        try:
+            for line in open(SEEN_LOG, "r", encoding="utf-8"):
+                uid=line.strip()
+                if uid: s[uid]=None
+                _seen_log_lines+=1
+        except: pass
+    return s
+def _compact_seen(s:dict):
+    global _seen_log_lines
+    if len(s) > SEEN_LIMIT:
+        for uid in list(s)[:len(s)-SEEN_LIMIT]:
+            bloom_add(uid); del s[uid]
+        save_bloom()
+    tmp=SEEN_LOG+".tmp"
+    with open(tmp,"w",encoding="utf-8") as f: f.write("".join(u+"\n" for u in s))
+    os.replace(tmp, SEEN_LOG)
+    _seen_log_lines=len(s)
+    if os.path.exists(SEEN_PATH):
+        try: os.remove(SEEN_PATH)
         except: pass
-    return set()
-def save_seen(s:set):
-    if len(s) > SEEN_LIMIT: s = set(list(s)[-SEEN_LIMIT:])
-    json.dump(list(s), open(SEEN_PATH,"w",encoding="utf-8"))
+def append_seen(s:dict, new_uids):
+    global _seen_log_lines
+    try:
+        with open(SEEN_LOG,"a",encoding="utf-8") as f:
+            f.write("".join(u+"\n" for u in new_uids))
+        _seen_log_lines+=len(new_uids)
+    except Exception as e: print("seen:",e)
+    if _seen_log_lines > 2*SEEN_LIMIT or os.path.exists(SEEN_PATH): _compact_seen(s)
+load_bloom()
 seen = load_seen()
 
 UA = {"User-Agent":"Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123 Safari/537.36"}
-def html_escape(s:str)->str: return (s or "").replace("&","&amp;").replace("<","&lt;").replace(">","&gt;")
-def normalize_title(t:str)->str: return re.sub(r"\s+"," ",re.sub(r"[^\w\s]"," ",(t or "").lower())).strip()
-def make_uid(t:str)->str: return hashlib.sha1(normalize_title(t).encode("utf-8")).hexdigest()
-def send_message(text:str):
+SESSION = requests.Session()
+SESSION.headers.update(UA)
+_adapter = requests.adapters.HTTPAdapter(pool_connections=32, pool_maxsize=32,
+                                         max_retries=Retry(total=2, backoff_factor=0.3))
+SESSION.mount("https://", _adapter); SESSION.mount("http://", _adapter)
+_HTML_TBL = str.maketrans({"&":"&amp;","<":"&lt;",">":"&gt;"})
+def html_escape(s:str)->str: return (s or "").translate(_HTML_TBL)
+_PUNCT_TBL = str.maketrans({c:" " for c in string.punctuation})
+_NORM_RE = re.compile(r"[^\w\s]")
+def normalize_title(t:str)->str:
+    t=(t or "").lower()
+    # ASCII fast path: one C-level translate; unicode titles keep the regex strip
+    t=t.translate(_PUNCT_TBL) if t.isascii() else _NORM_RE.sub(" ", t)
+    return " ".join(t.split())
+def make_uid(t:str)->str: return hashlib.blake2b(normalize_title(t).encode("utf-8"), digest_size=8).hexdigest()
+def _tg_send(text:str):
     try:
-        requests.get(f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage",
-                     params={"chat_id":TELEGRAM_CHAT_ID,"text":text,"parse_mode":"HTML",
-                             "disable_web_page_preview":True},timeout=15)
+        SESSION.post(f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage",
+                     data={"chat_id":TELEGRAM_CHAT_ID,"text":text,"parse_mode":"HTML",
+                           "disable_web_page_preview":True},timeout=15)
     except Exception as e: print("telegram:",e)
+_TG_Q=queue.Queue()
+def _tg_worker():
+    while True:
+        text=_TG_Q.get()
+        t0=time.monotonic()
+        _tg_send(text)
+        time.sleep(max(0.0, 1.0-(time.monotonic()-t0)))   # pace to ~1 msg/s per chat
+        _TG_Q.task_done()
+threading.Thread(target=_tg_worker, daemon=True).start()
+def send_message(text:str): _TG_Q.put(text)
 
+DOMAIN_LABELS={"reuters.com":"Reuters","cnbc.com":"CNBC","marketwatch.com":"MarketWatch",
+               "nasdaq.com":"Nasdaq","finance.yahoo.com":"Yahoo Finance","apnews.com":"AP News",
+               "theguardian.com":"The Guardian","cbsnews.com":"CBS","abcnews.go.com":"ABC News",
+               "bbc.com":"BBC","bbc.co.uk":"BBC"}
+@lru_cache(maxsize=256)
+def _publisher(host:str):
+    while host:   # walk suffixes: www.reuters.com -> reuters.com -> com
+        if host in DOMAIN_LABELS: return DOMAIN_LABELS[host]
+        if "." not in host: return None
+        host=host.split(".",1)[1]
+    return None
 def publisher_from_link(link:str,fallback:str)->str:
     try:
-        host=urlparse(link).netloc.lower(); dom=".".join(host.split(".")[-2:]) if "." in host else host
-        labels={"reuters.com":"Reuters","cnbc.com":"CNBC","marketwatch.com":"MarketWatch",
-                "nasdaq.com":"Nasdaq","finance.yahoo.com":"Yahoo Finance","apnews.com":"AP News",
-                "theguardian.com":"The Guardian","cbsnews.com":"CBS","abcnews.go.com":"ABC News",
-                "bbc.com":"BBC","bbc.co.uk":"BBC"}
-        return labels.get(dom,fallback)
+        host=link.split("://",1)[-1].split("/",1)[0].split("?",1)[0].split(":",1)[0].lower()
+        return _publisher(host) or fallback
     except: return fallback
 
+def _parse_ts(s:str)->datetime|None:
+    # sniff the shape first so the common mismatch doesn't raise
+    s=(s or "").strip()
+    if not s: return None
+    if len(s)>=10 and s[4]=="-" and s[7]=="-":    # ISO-8601
+        try: dt=datetime.fromisoformat(s)
+        except ValueError: return None
+    elif "," in s[:5] or s[0].isdigit():          # RFC-2822
+        try: dt=parsedate_to_datetime(s)
+        except Exception: return None
+    else: return None
+    if not dt.tzinfo: dt=dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
 def published_dt(entry)->datetime|None:
     for a in ("published_parsed","updated_parsed"):
         t=getattr(entry,a,None)
         if t: return datetime(*t[:6], tzinfo=timezone.utc)
     for a in ("published","updated","created"):
-        s=getattr(entry,a,None)
-        if s:
-            try:
-                dt=parsedate_to_datetime(s)
-                if not dt.tzinfo: dt=dt.replace(tzinfo=timezone.utc)
-                return dt.astimezone(timezone.utc)
-            except: pass
+        dt=_parse_ts(getattr(entry,a,None))
+        if dt: return dt
     return None
 
+_MON=("Jan","Feb","Mar","Apr","May","Jun","Jul","Aug","Sep","Oct","Nov","Dec")
+def fmt_est(dt_est:datetime)->str:
+    hh=dt_est.hour%12 or 12
+    ap="AM" if dt_est.hour<12 else "PM"
+    return f"{hh}:{dt_est.minute:02d} {ap} {_tz_label} • {_MON[dt_est.month-1]} {dt_est.day}"
+
 def human_ago(delta: timedelta)->str:
     m=int(delta.total_seconds()//60)
     if m<1: return "just now"
     if m<90: return f"{m} min ago"
     return f"{m//60} hr ago"
 
+def _parse_feed_fast(content:bytes):
+    # The bot only reads feed.feed.title and each entry's title/link/date, so
+    # stream just those out of the XML instead of paying feedparser's full
+    # normalization; items are cleared as they complete to keep memory flat.
+    try:
+        feed_title=None; entries=[]
+        for _,el in ET.iterparse(io.BytesIO(content), events=("end",)):
+            tag=el.tag.rsplit("}",1)[-1]
+            if tag in ("item","entry"):
+                title=link=pub=None
+                for ch in el:
+                    ctag=ch.tag.rsplit("}",1)[-1]
+                    if ctag=="title" and not title: title=ch.text
+                    elif ctag=="link" and not link: link=(ch.text or "").strip() or ch.get("href")
+                    elif ctag in ("pubDate","published","updated","date") and not pub: pub=ch.text
+                entries.append(SimpleNamespace(title=title or "", link=link or "", published=pub))
+                el.clear()
+            elif tag=="title" and feed_title is None and not entries:
+                feed_title=el.text
+        if entries:
+            return SimpleNamespace(feed=SimpleNamespace(title=feed_title), entries=entries)
+    except Exception: pass
+    return None   # caller falls back to feedparser
+
+_FEED_STATE={}   # url -> {"etag","lm","feed"} for conditional GETs
+_FAIL_STATE={}   # url -> (consecutive_failures, retry_at) backoff for dead feeds
 def parse_feed(url:str):
+    fails,retry_at=_FAIL_STATE.get(url,(0,0.0))
+    if time.time()<retry_at: return None
+    st=_FEED_STATE.get(url)
+    headers={}
+    if st:
+        if st.get("etag"): headers["If-None-Match"]=st["etag"]
+        if st.get("lm"): headers["If-Modified-Since"]=st["lm"]
     try:
-        r=requests.get(url, headers=UA, timeout=15)
-        if r.ok and r.content: return feedparser.parse(r.content)
+        with SESSION.get(url, headers=headers, timeout=15, stream=True) as r:
+            if r.status_code==304 and st:
+                _FAIL_STATE.pop(url,None)
+                return st["feed"]
+            if r.ok:
+                buf=bytearray()
+                for chunk in r.iter_content(65536):
+                    buf.extend(chunk)
+                    if len(buf)>FEED_MAX_BYTES: break   # safety valve for pathological bodies
+                if buf:
+                    feed=_parse_feed_fast(bytes(buf)) or _feedparser().parse(bytes(buf))
+                    _FEED_STATE[url]={"etag":r.headers.get("ETag"),"lm":r.headers.get("Last-Modified"),"feed":feed}
+                    _FAIL_STATE.pop(url,None)
+                    return feed
     except: pass
+    _FAIL_STATE[url]=(fails+1, time.time()+min(1800, 30*2**fails))
     return None
 
 # --- Market keywords ---
@@ -103,42 +267,57 @@ KEYWORDS = [
     "yields rise","inflation cools","inflation data","central bank","interest rates","bond yields",
 ]
 
-def has_keywords(t:str)->bool:
-    t=t.lower()
-    return any(k in t for k in KEYWORDS)
+_KW_RE = re.compile("|".join(map(re.escape, KEYWORDS)))
+try:
+    import ahocorasick                     # C automaton: one pass regardless of keyword count
+    _KW_AC = ahocorasick.Automaton()
+    for k in KEYWORDS: _KW_AC.add_word(k, k)
+    _KW_AC.make_automaton()
+except Exception:
+    _KW_AC = None
+
+@lru_cache(maxsize=4096)
+def has_keywords(t_lower:str)->bool:
+    # caller passes the already-lowercased title
+    if _KW_AC is not None: return next(_KW_AC.iter(t_lower), None) is not None
+    return _KW_RE.search(t_lower) is not None
 
 def fetch_once():
     global seen
-    items=[]
+    items=[]; cycle_uids=set()
     now_utc=datetime.now(timezone.utc)
-    for url in FEEDS:
-        feed=parse_feed(url)
+    with ThreadPoolExecutor(max_workers=min(FEED_WORKERS, len(FEEDS) or 1)) as ex:
+        feeds=list(ex.map(parse_feed, FEEDS))
+    for url,feed in zip(FEEDS,feeds):
         if not feed: continue
         src=(getattr(getattr(feed,"feed",None),"title",None) or url).strip()
         for e in getattr(feed,"entries",[])[:10]:
             title=(getattr(e,"title","") or "").strip()
             link=(getattr(e,"link","") or "").strip()
             if not title: continue
-            if not has_keywords(title): continue
+            title_l=title.lower()   # lowercase once; the screens below reuse it
+            if not has_keywords(title_l): continue
             dt=published_dt(e) or now_utc
             if (now_utc - dt) > timedelta(minutes=MAX_AGE_MINUTES): continue
-            uid=make_uid(title)
-            if uid in seen: continue
-            items.append({"title":title,"src":src,"link":link,"dt":dt})
-    items.sort(key=lambda x:x["dt"], reverse=True)
-    posted=0
-    for it in items[:MAX_POSTS_PER_CYCLE]:
-        dt_est=it["dt"].astimezone(EST)
-        when=f"{dt_est.strftime('%-I:%M %p ')}{_tz_label} • {dt_est.strftime('%b %-d')} ({human_ago(datetime.now(timezone.utc)-it['dt'])})"
+            uid=make_uid(title_l)
+            if uid in seen or uid in cycle_uids or bloom_has(uid): continue
+            cycle_uids.add(uid)
+            items.append({"title":title,"src":src,"link":link,"dt":dt,"ts":dt.timestamp(),"uid":uid})
+    new_uids=[]
+    now_post=datetime.now(timezone.utc)
+    est_off=now_post.astimezone(EST).utcoffset()   # DST-correct for this cycle
+    for it in heapq.nlargest(MAX_POSTS_PER_CYCLE, items, key=lambda x:x["ts"]):
+        dt_est=it["dt"]+est_off
+        when=f"{fmt_est(dt_est)} ({human_ago(now_post-it['dt'])})"
         src=publisher_from_link(it["link"],it["src"])
         msg=(f"📰 {html_escape(it['title'])}\n"
              f"🔗 <a href=\"{html_escape(it['link'])}\">{html_escape(src)}</a>\n"
              f"🕒 {html_escape(when)}")
         send_message(msg)
-        seen.add(make_uid(it["title"]))
-        posted+=1
-        time.sleep(1)
-    if posted: save_seen(seen)
+        new_uids.append(it["uid"])
+    if new_uids:
+        seen.update(dict.fromkeys(new_uids))
+        append_seen(seen, new_uids)
 
 def main():
     send_message("✅ Keyword NASDAQ news bot started (every 5 min, ≤15 min old).")